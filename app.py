@@ -3,10 +3,17 @@ import pandas as pd
 from datetime import datetime
 import pytz
 import re
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import time
+import io
+import os
+import uuid
+import hashlib
+from name_matching import propose_matches
+from trends import ROLLING_WEEKS, compute_trend_metrics
+from send_worker import SendJob, SendWorker
+from exports import EXPORT_FORMATS, export_bytes, export_zip
+from sheet_fetch import clear_schema_cache, export_url, fetch_parent_contacts, parse_sheet_url
+from shared_store import MB, SharedStore, frame_bytes
 
 # --- Session State for Settings ---
 if 'saved_settings' not in st.session_state:
@@ -17,6 +24,12 @@ if 'saved_settings' not in st.session_state:
         'password': '',
         'sheet_url': ''
     }
+if 'accepted_matches' not in st.session_state:
+    st.session_state.accepted_matches = {}
+# Identifies this browser session in the shared data store
+if 'session_key' not in st.session_state:
+    st.session_state.session_key = uuid.uuid4().hex[:8]
+session_key = st.session_state.session_key
 
 # Use Eastern Time
 eastern = pytz.timezone("America/New_York")
@@ -25,7 +38,10 @@ today = datetime.now(eastern)
 st.title("📊 Weekly Study Activity Tracker")
 st.caption(f"Report generated at {today.strftime('%I:%M %p on %B %d, %Y')} (Eastern Time)")
 
-report_mode = st.radio("Choose Report Mode", ["📅 Weekly Comparison", "🗓️ Monthly Summary"])
+report_mode = st.radio("Choose Report Mode", ["📅 Weekly Comparison", "📈 Multi-Week Trends", "🗓️ Monthly Summary"])
+export_format = st.sidebar.radio("Download format", list(EXPORT_FORMATS), horizontal=True)
+# Tables offered for download on this run, bundled by the "download all" button
+page_exports = {}
 
 def extract_date_from_filename(filename):
     match = re.search(r'(\d{8})', filename)
@@ -73,12 +89,285 @@ def load_parent_map(url):
                     break
     return parent_map
 
+# Load parent contacts, fetching only the needed columns (and optionally rows)
+# from Google Sheets, or falling back to the whole CSV export
+def load_contacts(parent_map_url, login_ids=None):
+    contacts = fetch_parent_contacts(parent_map_url, login_ids)
+    if contacts is not None:
+        return contacts
+    # Strip query parameters and hash fragments before extracting sheet ID
+    url_base = parent_map_url.split("?")[0].split("#")[0]
+    if (
+        "docs.google.com/spreadsheets" in url_base
+        and "export?format=csv" not in parent_map_url
+    ):
+        parsed = parse_sheet_url(parent_map_url)
+        if parsed:
+            parent_map_url = export_url(*parsed)
+    return load_parent_map(parent_map_url)
+
+# Contact sheets are shared between sessions for a few minutes, so staff
+# loading the same sheet at the same time only download it once
+CONTACTS_TTL_SECONDS = 300
+
+# Shows the memory admin view when the page is opened with ?admin=<token>
+ADMIN_TOKEN = os.environ.get("TRACKER_ADMIN_TOKEN")
+
+# One shared data store per server process, used by every session
+@st.cache_resource
+def get_shared_store():
+    return SharedStore()
+
+# Stop the run if this session holds more than its memory cap
+def enforce_session_cap():
+    store = get_shared_store()
+    if store.over_cap(session_key):
+        usage = store.session_usage(session_key, current_run=True)
+        store.release_run(session_key)
+        st.error(
+            f"⚠️ This session is using {usage['charged'] / MB:.1f} MB, over the "
+            f"{store.session_cap_bytes / MB:.1f} MB limit per user. Upload fewer or smaller files."
+        )
+        st.stop()
+
+# Parse an uploaded CSV once per distinct file; sessions uploading the same file share it
+def read_upload(uploaded_file, slot):
+    data = uploaded_file.getvalue()
+    key = "csv:" + hashlib.blake2b(data, digest_size=16).hexdigest()
+    store = get_shared_store()
+    df = store.get_or_create(
+        session_key, slot, key,
+        lambda: pd.read_csv(io.BytesIO(data)),
+        kind="upload", label=uploaded_file.name
+    )
+    # Streamlit keeps each session's own copy of the uploaded bytes
+    store.set_private(session_key, f"upload:{slot}", len(data))
+    enforce_session_cap()
+    return df
+
+def shared_contacts(parent_map_url, login_ids=None):
+    ids = ",".join(sorted(set(login_ids))) if login_ids is not None else "*"
+    key = "contacts:" + hashlib.blake2b(f"{parent_map_url}|{ids}".encode(), digest_size=16).hexdigest()
+    contacts = get_shared_store().get_or_create(
+        session_key, "contacts", key,
+        lambda: load_contacts(parent_map_url, login_ids),
+        kind="contacts", label=parent_map_url, ttl=CONTACTS_TTL_SECONDS
+    )
+    enforce_session_cap()
+    return contacts
+
+def show_memory_admin():
+    store = get_shared_store()
+    entries, sessions, total = store.stats()
+    st.subheader("🛠️ Server Memory")
+    st.markdown(f"""
+- 🗄️ **{total / MB:.1f} MB** in the shared store (cap {store.cap_bytes / MB:.0f} MB, {len(entries)} entries)
+- 👥 **{len(sessions)} sessions** (cap {store.session_cap_bytes / MB:.0f} MB each)
+""")
+    st.write("**Sessions**")
+    st.dataframe(sessions)
+    st.write("**Shared data**")
+    st.dataframe(entries)
+
+# Download button for a table; the file is only built (and cached) when clicked
+def download_table(label, df, file_stem):
+    ext, mime = EXPORT_FORMATS[export_format]
+    page_exports[file_stem] = df
+    # The button keeps the table in memory until this session's next run, so it
+    # counts against the cap before the button is rendered
+    get_shared_store().set_private(session_key, f"export:{file_stem}", frame_bytes(df))
+    enforce_session_cap()
+    st.download_button(
+        f"{label} {export_format}",
+        data=lambda fmt=export_format: export_bytes(df, fmt),
+        file_name=f"{file_stem}.{ext}",
+        mime=mime,
+        on_click="ignore"
+    )
+
+# Trend columns exposed to the email template as {placeholder}
+TREND_PLACEHOLDERS = {
+    "streak": "Active Streak",
+    "longest_streak": "Longest Streak",
+    "weeks_active": "Weeks Active",
+    "avg_worksheets": f"Avg Worksheets ({ROLLING_WEEKS} wk)",
+    "avg_days": f"Avg Study Days ({ROLLING_WEEKS} wk)",
+}
+
+def format_email_body(template, row, date_range_str):
+    trend_values = {
+        key: row.get(col) if pd.notna(row.get(col)) else ""
+        for key, col in TREND_PLACEHOLDERS.items()
+    }
+    return template.format(
+        parent=row.get('Parent Name') if pd.notna(row.get('Parent Name')) else "Parent",
+        student=row['Full Name'],
+        worksheets=row.get("Worksheets This Week", row.get("Worksheets This Month", 0)),
+        days=row.get("Study Days This Week", row.get("Study Days This Month", 0)),
+        highest_ws=row['Highest WS Completed'],
+        date_range=date_range_str,
+        **trend_values
+    )
+
+# Fill in parent contacts for students whose fuzzy name match was accepted
+def apply_accepted_matches(df):
+    accepted = st.session_state.accepted_matches
+    if not accepted or "Login ID" not in df.columns:
+        return df
+    df = df.copy()
+    for col in ["Parent Email", "Parent Name"]:
+        if col not in df.columns:
+            df[col] = None
+    missing = df["Parent Email"].isnull() & df["Login ID"].isin(accepted.keys())
+    for col in ["Parent Email", "Parent Name"]:
+        df.loc[missing, col] = df.loc[missing, "Login ID"].map(lambda login_id: accepted[login_id][col])
+    return df
+
+# Suggest fuzzy name matches for unmatched students and let them be accepted in bulk
+def show_match_proposals(unmatched_df, parent_map, matched_ids, key):
+    proposals = propose_matches(unmatched_df, parent_map, matched_ids)
+    if proposals.empty:
+        return
+    st.subheader("🔍 Suggested Parent Matches")
+    st.write("These students didn't match by Login ID, but their names look like an entry in the contact sheet.")
+    preselect = st.radio(
+        "Pre-select suggestions with confidence",
+        ["High", "High + Medium", "All"],
+        horizontal=True,
+        key=f"{key}_preselect"
+    )
+    levels = {"High": ["High"], "High + Medium": ["High", "Medium"], "All": ["High", "Medium", "Low", "Ambiguous"]}[preselect]
+    proposals.insert(0, "Accept", proposals["Confidence"].isin(levels))
+    edited = st.data_editor(
+        proposals,
+        disabled=[col for col in proposals.columns if col != "Accept"],
+        hide_index=True,
+        key=f"{key}_editor_{preselect}"
+    )
+    if st.button("✅ Accept Selected Matches", key=f"{key}_accept"):
+        for _, row in edited[edited["Accept"]].iterrows():
+            st.session_state.accepted_matches[str(row["Login ID"])] = {
+                "Parent Email": row["Parent Email"],
+                "Parent Name": row["Parent Name"] if pd.notna(row["Parent Name"]) else None
+            }
+        st.rerun()
+    if st.session_state.accepted_matches and st.button("↩️ Clear Accepted Matches", key=f"{key}_clear"):
+        st.session_state.accepted_matches = {}
+        st.rerun()
+
+# Seconds between refreshes of the send status panel while a job is running
+SEND_STATUS_REFRESH = 1.0
+
+# One send worker per server process, shared by every session
+@st.cache_resource
+def get_send_worker():
+    return SendWorker()
+
+# Queue the selected preview rows as a background send job
+def submit_send_job(preview_df, sender_email, sender_pass, subject_line, send_to_self, test_mode):
+    columns = ["Login ID", "Full Name", "Parent Name", "Parent Email", "Email Body"]
+    rows = preview_df.reindex(columns=columns).rename(columns={"Email Body": "Body"})
+    preview = rows.iloc[0].to_dict() if send_to_self and not rows.empty else None
+    # Test mode prints every selected row; a real send skips the batch when only previewing to self
+    if test_mode:
+        emails = rows.to_dict("records")
+    elif not send_to_self:
+        emails = rows.dropna(subset=["Parent Email"]).to_dict("records")
+    else:
+        emails = []
+    job = SendJob(sender_email, sender_pass, subject_line, emails, preview=preview, test_mode=test_mode)
+    st.session_state.send_job_id = get_send_worker().submit(job)
+    # Only jobs submitted from this session are listed in its status panel; they also go in
+    # the page link, since a browser refresh starts a new session
+    st.session_state.setdefault('send_job_ids', []).append(st.session_state.send_job_id)
+    st.query_params["job"] = st.session_state.send_job_ids
+
+def render_send_job(job_id):
+    job = get_send_worker().get(job_id)
+    if job is None:
+        st.info("This send job is no longer available.")
+        return
+    snap = job.snapshot()
+    finished = snap['status'] in ("done", "failed")
+    progress_value = min(snap['done'] / snap['total'], 1.0) if snap['total'] else (1.0 if finished else 0.0)
+    mode = " (Test Mode)" if snap['test_mode'] else ""
+    st.progress(progress_value, text=f"Job {snap['id'][:8]}{mode}: {snap['status']} – {snap['done']}/{snap['total']} emails")
+    for level, text in snap['notices']:
+        getattr(st, level)(text)
+    if snap['test_output']:
+        with st.expander(f"📨 Test mode output ({len(snap['test_output'])} emails)"):
+            for label, body in snap['test_output']:
+                st.write(f"📨 {label}")
+                st.code(body)
+    if snap['failed_emails']:
+        failed_df = pd.DataFrame(snap['failed_emails'])
+        st.subheader("❌ Failed Email Report")
+        st.dataframe(failed_df)
+        if finished:
+            download_table("Download Failed Emails", failed_df, "failed_emails")
+    if snap['email_log']:
+        email_log_df = pd.DataFrame(snap['email_log'])
+        st.subheader("📜 Email Log")
+        st.dataframe(email_log_df)
+        if finished:
+            download_table("Download Email Log", email_log_df, "email_log")
+    # Once the job finishes, rerun the whole page so polling stops
+    if finished and st.session_state.get('send_job_polling') == job_id:
+        st.session_state.send_job_polling = None
+        if snap['status'] == "done" and not snap['failed_emails']:
+            st.session_state.send_job_celebrate = job_id
+        st.rerun()
+
+# Live status of the send jobs submitted from this session, refreshed while a job is still running
+def show_send_status():
+    worker = get_send_worker()
+    session_job_ids = st.session_state.setdefault('send_job_ids', [])
+    # Pick up jobs from the page link after a refresh
+    for job_id in st.query_params.get_all("job"):
+        if job_id not in session_job_ids and worker.get(job_id) is not None:
+            session_job_ids.append(job_id)
+    jobs = [job for job in map(worker.get, session_job_ids) if job is not None]
+    current = worker.get(st.session_state.get('send_job_id'))
+    if not jobs:
+        return
+    st.subheader("📬 Send Status")
+    st.caption("🔗 This page's link includes your send jobs. Bookmark it or reopen it to check on them after a refresh.")
+    job_ids = [job.id for job in reversed(jobs)]
+    job_id = st.selectbox(
+        "Send job",
+        job_ids,
+        index=job_ids.index(current.id) if current is not None else 0,
+        format_func=lambda i: f"{i[:8]} – submitted {worker.get(i).timestamp}" if worker.get(i) else i
+    )
+    job = worker.get(job_id)
+    polling = job is not None and not job.finished
+    if polling:
+        st.session_state.send_job_polling = job_id
+    if st.session_state.get('send_job_celebrate') == job_id:
+        st.session_state.send_job_celebrate = None
+        st.balloons()
+    st.fragment(render_send_job, run_every=SEND_STATUS_REFRESH if polling else None)(job_id)
+
+get_shared_store().begin_run(session_key)
+
 # --- Report Modes ---
-if report_mode == "📅 Weekly Comparison":
-    st.write("Upload last week's and this week's CSV files to compare study progress.")
-    # File uploaders
-    last_week_file = st.file_uploader("Upload LAST week's CSV", type="csv", key="last")
-    this_week_file = st.file_uploader("Upload THIS week's CSV", type="csv", key="this")
+if report_mode in ["📅 Weekly Comparison", "📈 Multi-Week Trends"]:
+    trend_mode = report_mode == "📈 Multi-Week Trends"
+    if trend_mode:
+        st.write("Upload several weekly CSV exports at once. They are ordered by the date in each file name, and the latest two are compared like the weekly report.")
+        trend_files = st.file_uploader("Upload weekly CSVs", type="csv", accept_multiple_files=True, key="trend")
+        dated_files = sorted(
+            [f for f in trend_files if extract_date_from_filename(f.name)],
+            key=lambda f: extract_date_from_filename(f.name)
+        )
+        if len(dated_files) < len(trend_files):
+            st.warning("⚠️ Some files were skipped because their names don't contain a date (MMDDYYYY).")
+        last_week_file, this_week_file = (dated_files[-2], dated_files[-1]) if len(dated_files) >= 2 else (None, None)
+    else:
+        st.write("Upload last week's and this week's CSV files to compare study progress.")
+        # File uploaders
+        last_week_file = st.file_uploader("Upload LAST week's CSV", type="csv", key="last")
+        this_week_file = st.file_uploader("Upload THIS week's CSV", type="csv", key="this")
 
     if last_week_file and this_week_file:
         # Display file names
@@ -105,8 +394,13 @@ if report_mode == "📅 Weekly Comparison":
             st.markdown(f"**Date Range:** {date_last.strftime('%B %d, %Y')} to {date_this.strftime('%B %d, %Y')}  ")
             st.markdown(f"**Days Between Reports:** {delta_days} days")
 
-        last_df = pd.read_csv(last_week_file)
-        this_df = pd.read_csv(this_week_file)
+        if trend_mode:
+            snapshots = [(extract_date_from_filename(f.name), read_upload(f, f"trend:{i}")) for i, f in enumerate(dated_files)]
+            last_df = snapshots[-2][1].copy()
+            this_df = snapshots[-1][1].copy()
+        else:
+            last_df = read_upload(last_week_file, "last")
+            this_df = read_upload(this_week_file, "this")
 
         # Ensure Login ID is treated as string
         last_df["Login ID"] = last_df["Login ID"].astype(str)
@@ -152,15 +446,34 @@ if report_mode == "📅 Weekly Comparison":
             "Days_This": "Study Days This Week"
         })
 
+        if trend_mode:
+            trend_metrics, ws_by_week = compute_trend_metrics(snapshots)
+            weekly_report = pd.merge(weekly_report, trend_metrics, on="Login ID", how="left")
+
         st.subheader("📈 Returning Students – Weekly Progress")
         st.dataframe(weekly_report)
 
         st.subheader("🆕 New Students")
         st.dataframe(new_students)
 
+        if trend_mode:
+            st.subheader(f"📉 Trends Across {len(snapshots)} Reports")
+            st.markdown(f"**Reports:** {snapshots[0][0].strftime('%B %d, %Y')} to {snapshots[-1][0].strftime('%B %d, %Y')}")
+            center_totals = ws_by_week.sum().rename("Worksheets Completed")
+            center_totals.index = [week.strftime('%b %d') for week in center_totals.index]
+            st.line_chart(center_totals)
+            names = pd.concat([df[["Login ID", "Full Name"]].astype({"Login ID": str}) for _, df in snapshots]).drop_duplicates("Login ID", keep="last")
+            trend_report = pd.merge(names, trend_metrics, on="Login ID", how="right")
+            dropped_off = trend_report[trend_report["Dropped Off"]]
+            if not dropped_off.empty:
+                st.warning(f"⚠️ {len(dropped_off)} students have had no worksheet activity in recent weeks.")
+                st.dataframe(dropped_off)
+            st.dataframe(trend_report)
+            download_table("Download Trend Report", trend_report, "trend_report")
+
         # Option to download results
-        st.download_button("Download Weekly Report CSV", data=weekly_report.to_csv(index=False), file_name="weekly_report.csv")
-        st.download_button("Download New Students CSV", data=new_students.to_csv(index=False), file_name="new_students.csv")
+        download_table("Download Weekly Report", weekly_report, "weekly_report")
+        download_table("Download New Students", new_students, "new_students")
 
         st.subheader("📧 Email Weekly Reports to Parents")
 
@@ -173,8 +486,11 @@ if report_mode == "📅 Weekly Comparison":
             value=st.session_state.saved_settings['subject'] or (f"Your Child's Weekly {subject_type} Progress" if subject_type else "Your Child's Weekly Study Progress")
         )
         # Message template with new default and {date_range}
+        placeholders = "{parent}, {student}, {worksheets}, {days}, {highest_ws}, {date_range}"
+        if trend_mode:
+            placeholders += ", " + ", ".join("{" + key + "}" for key in TREND_PLACEHOLDERS)
         message_template = st.text_area(
-            "Email Message Template (use {parent}, {student}, {worksheets}, {days}, {highest_ws}, {date_range})",
+            f"Email Message Template (use {placeholders})",
             value=st.session_state.saved_settings['message'] or (
                 "Dear {parent},\n\n"
                 "Here is the weekly study update for {student} from {date_range}:\n"
@@ -202,21 +518,19 @@ if report_mode == "📅 Weekly Comparison":
             st.success("✅ Settings saved.")
 
         refresh = st.button("🔄 Refresh Parent Contact Data")
+        only_report_contacts = st.checkbox(
+            "Only download contacts for students in this report",
+            value=False,
+            help="Smaller, faster download from Google Sheets. Leave it off to get suggested matches for students whose Login ID doesn't match."
+        )
 
         if parent_map_url:
             # Always load the map, and allow refresh to be a manual trigger too
-            # Strip query parameters and hash fragments before extracting sheet ID
-            url_base = parent_map_url.split("?")[0].split("#")[0]
-            if (
-                "docs.google.com/spreadsheets" in url_base
-                and "export?format=csv" not in parent_map_url
-            ):
-                sheet_id_match = re.search(r"/d/([a-zA-Z0-9-_]+)", url_base)
-                if sheet_id_match:
-                    sheet_id = sheet_id_match.group(1)
-                    parent_map_url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv"
-
-            parent_map = load_parent_map(parent_map_url)
+            if refresh:
+                clear_schema_cache(parent_map_url)
+                get_shared_store().invalidate(parent_map_url)
+            report_ids = pd.concat([weekly_report["Login ID"], new_students["Login ID"]]).astype(str)
+            parent_map = shared_contacts(parent_map_url, report_ids if only_report_contacts else None)
             st.write("Loaded Parent Map Columns:", parent_map.columns.tolist())
             parent_map.columns = parent_map.columns.str.strip()
             # Ensure "Parent Email" column exists, else fallback to any column containing "email"
@@ -247,6 +561,7 @@ if report_mode == "📅 Weekly Comparison":
             full_report["Full Name"] = weekly_report["Full Name"]
             if "Login ID" not in full_report.columns:
                 full_report = pd.merge(full_report, this_trimmed[["Login ID", "Full Name"]], on="Full Name", how="left")
+            full_report = apply_accepted_matches(full_report)
 
             unmatched_parents = full_report[full_report["Parent Email"].isnull()][["Login ID", "Full Name"]].copy()
             unmatched_parents["Reason"] = "No matching parent email"
@@ -262,13 +577,19 @@ if report_mode == "📅 Weekly Comparison":
                         break
             if "Login ID" not in new_students_merged.columns:
                 new_students_merged = pd.merge(new_students_merged, this_trimmed[["Login ID", "Full Name"]], on="Full Name", how="left")
+            new_students_merged = apply_accepted_matches(new_students_merged)
             unmatched_new = new_students_merged[new_students_merged["Parent Email"].isnull()][["Login ID", "Full Name"]].copy()
             unmatched_new["Reason"] = "New student with no parent email"
             unmatched_all = pd.concat([unmatched_parents, unmatched_new], ignore_index=True)
             if not unmatched_all.empty:
                 st.subheader("⚠️ Students Without Parent Emails")
                 st.dataframe(unmatched_all)
-                st.download_button("Download Missing Parent Emails CSV", data=unmatched_all.to_csv(index=False), file_name="missing_parent_emails.csv")
+                download_table("Download Missing Parent Emails", unmatched_all, "missing_parent_emails")
+                matched_ids = pd.concat([
+                    full_report.loc[full_report["Parent Email"].notnull(), "Login ID"],
+                    new_students_merged.loc[new_students_merged["Parent Email"].notnull(), "Login ID"]
+                ])
+                show_match_proposals(unmatched_all, parent_map, matched_ids, key="weekly_match")
             if full_report["Parent Email"].isnull().any():
                 st.warning("⚠️ Some students do not have a matching parent email in the mapping file.")
             else:
@@ -318,14 +639,7 @@ if report_mode == "📅 Weekly Comparison":
                 st.warning("⚠️ 'Parent Email' column not found in preview data. Skipping email preview filtering.")
                 preview_df["Valid Email"] = "❌"
             preview_df["Email Body"] = preview_df.apply(
-                lambda row: message_template.format(
-                    parent=row.get('Parent Name') if pd.notna(row.get('Parent Name')) else "Parent",
-                    student=row['Full Name'],
-                    worksheets=row.get("Worksheets This Week", row.get("Worksheets This Month", 0)),
-                    days=row.get("Study Days This Week", row.get("Study Days This Month", 0)),
-                    highest_ws=row['Highest WS Completed'],
-                    date_range=date_range_str
-                ), axis=1)
+                lambda row: format_email_body(message_template, row, date_range_str), axis=1)
 
             # Dynamically show checkboxes for each student
             with st.container():
@@ -345,137 +659,8 @@ if report_mode == "📅 Weekly Comparison":
             # --- Send Emails Section ---
             test_mode = st.checkbox("Test Mode (Print emails to console only, do not send)", value=True)
             if st.button("Send Emails"):
-                progress_bar = st.progress(0)
-                total = len(preview_df.dropna(subset=["Parent Email"]))
-                email_log = []
-                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-                # Preview to self (always send, then print if test_mode)
-                if send_to_self:
-                    row = preview_df.iloc[0]
-                    body = message_template.format(
-                        parent=row.get('Parent Name', 'Parent'),
-                        student=row['Full Name'],
-                        worksheets=row.get("Worksheets This Week", row.get("Worksheets This Month", 0)),
-                        days=row.get("Study Days This Week", row.get("Study Days This Month", 0)),
-                        highest_ws=row['Highest WS Completed'],
-                        date_range=date_range_str
-                    )
-                    msg = MIMEMultipart()
-                    msg['From'] = sender_email
-                    msg['To'] = sender_email
-                    msg['Subject'] = subject_line
-                    msg.attach(MIMEText(body, 'plain'))
-                    try:
-                        server = smtplib.SMTP("smtp.gmail.com", 587)
-                        server.starttls()
-                        server.login(sender_email, sender_pass)
-                        server.send_message(msg)
-                        server.quit()
-                        if test_mode:
-                            st.write("📨 Preview email (to self):")
-                            st.code(body)
-                        else:
-                            st.success("✅ Preview email sent to yourself.")
-                        email_log.append({
-                            'Timestamp': timestamp,
-                            'Login ID': row['Login ID'],
-                            'Student': row['Full Name'],
-                            'Parent Email': sender_email,
-                            'Status': 'Preview to Self' + (' (Test Mode)' if test_mode else '')
-                        })
-                    except Exception as e:
-                        st.error(f"❌ Failed to send preview email to yourself: {e}")
-
-                # Now branch: test_mode or real send (excluding first row if send_to_self)
-                if test_mode:
-                    for i, (_, row) in enumerate(preview_df.iterrows()):
-                        print(f"TO: {row['Parent Email']}")
-                        body = message_template.format(
-                            parent=row.get('Parent Name', 'Parent'),
-                            student=row['Full Name'],
-                            worksheets=row.get("Worksheets This Week", row.get("Worksheets This Month", 0)),
-                            days=row.get("Study Days This Week", row.get("Study Days This Month", 0)),
-                            highest_ws=row['Highest WS Completed'],
-                            date_range=date_range_str
-                        )
-                        print(body)
-                        st.write(f"📨 Email to: {row['Parent Email']}")
-                        st.code(body)
-                        email_log.append({
-                            'Timestamp': timestamp,
-                            'Login ID': row['Login ID'],
-                            'Student': row['Full Name'],
-                            'Parent Email': row['Parent Email'],
-                            'Status': 'Test Mode'
-                        })
-                        progress_value = min((i + 1) / total, 1.0) if total else 1.0
-                        progress_bar.progress(progress_value)
-                    if email_log:
-                        email_log_df = pd.DataFrame(email_log)
-                        st.subheader("📜 Test Mode Email Log")
-                        st.dataframe(email_log_df)
-                    st.success("✅ Test mode: Emails printed to console.")
-                    st.balloons()
-                elif not send_to_self:
-                    try:
-                        server = smtplib.SMTP("smtp.gmail.com", 587)
-                        server.starttls()
-                        server.login(sender_email, sender_pass)
-                        failed_emails = []
-                        email_rows = preview_df.copy()
-                        if send_to_self:
-                            email_rows = email_rows.iloc[1:]
-                        for i, (_, row) in enumerate(email_rows.dropna(subset=["Parent Email"]).iterrows()):
-                            try:
-                                msg = MIMEMultipart()
-                                msg['From'] = sender_email
-                                msg['To'] = str(row['Parent Email'])
-                                msg['Subject'] = subject_line
-                                body = message_template.format(
-                                    parent=row.get('Parent Name', 'Parent'),
-                                    student=row['Full Name'],
-                                    worksheets=row.get("Worksheets This Week", row.get("Worksheets This Month", 0)),
-                                    days=row.get("Study Days This Week", row.get("Study Days This Month", 0)),
-                                    highest_ws=row['Highest WS Completed'],
-                                    date_range=date_range_str
-                                )
-                                msg.attach(MIMEText(body, 'plain'))
-                                server.send_message(msg)
-                                email_log.append({
-                                    'Timestamp': timestamp,
-                                    'Login ID': row['Login ID'],
-                                    'Student': row['Full Name'],
-                                    'Parent Email': row['Parent Email'],
-                                    'Status': 'Sent'
-                                })
-                            except Exception as e:
-                                failed_emails.append({
-                                    'Login ID': row.get('Login ID', ''),
-                                    'Full Name': row.get('Full Name', ''),
-                                    'Parent Name': row.get('Parent Name', ''),
-                                    'Parent Email': row.get('Parent Email', ''),
-                                    'Error': str(e)
-                                })
-                            progress_value = min((i + 1) / total, 1.0) if total else 1.0
-                            progress_bar.progress(progress_value)
-                        server.quit()
-                        if failed_emails:
-                            failed_df = pd.DataFrame(failed_emails)
-                            st.subheader("❌ Failed Email Report")
-                            st.dataframe(failed_df)
-                            st.download_button("Download Failed Emails CSV", data=failed_df.to_csv(index=False), file_name="failed_emails.csv")
-                        else:
-                            st.success("✅ Emails sent successfully!")
-                            st.balloons()
-                    except Exception as e:
-                        st.error(f"❌ Failed to send emails: {e}")
-                # --- Show Email Log if any emails handled ---
-                if email_log:
-                    email_log_df = pd.DataFrame(email_log)
-                    st.subheader("📜 Email Log")
-                    st.dataframe(email_log_df)
-                    st.download_button("Download Email Log", data=email_log_df.to_csv(index=False), file_name="email_log.csv")
+                submit_send_job(preview_df, sender_email, sender_pass, subject_line, send_to_self, test_mode)
+            show_send_status()
 
 
 elif report_mode == "🗓️ Monthly Summary":
@@ -498,7 +683,7 @@ elif report_mode == "🗓️ Monthly Summary":
         elif "reading" in monthly_file.name.lower():
             subject_type = "Reading"
 
-        month_df = pd.read_csv(monthly_file)
+        month_df = read_upload(monthly_file, "monthly")
         month_df["Login ID"] = month_df["Login ID"].astype(str)
 
         summary = month_df[["Login ID", "Full Name", "# of WS", "# of Study Days", "Highest WS Completed"]].copy()
@@ -508,28 +693,21 @@ elif report_mode == "🗓️ Monthly Summary":
         })
 
         st.dataframe(summary)
-        st.download_button("Download Monthly Summary CSV", data=summary.to_csv(index=False), file_name="monthly_summary.csv")
+        download_table("Download Monthly Summary", summary, "monthly_summary")
 
         # Ensure parent_map_url is defined before charts section
         parent_map_url = st.session_state.saved_settings.get('sheet_url', '')
+        refresh = st.button("🔄 Refresh Parent Contact Data")
+        if parent_map_url and refresh:
+            clear_schema_cache(parent_map_url)
+            get_shared_store().invalidate(parent_map_url)
 
         # --- Charts Section ---
         st.subheader("📊 Student Engagement Charts")
         import altair as alt
 
         if parent_map_url:
-            # Strip query parameters and hash fragments before extracting sheet ID
-            url_base = parent_map_url.split("?")[0].split("#")[0]
-            if (
-                "docs.google.com/spreadsheets" in url_base
-                and "export?format=csv" not in parent_map_url
-            ):
-                sheet_id_match = re.search(r"/d/([a-zA-Z0-9-_]+)", url_base)
-                if sheet_id_match:
-                    sheet_id = sheet_id_match.group(1)
-                    parent_map_url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv"
-
-            parent_map = load_parent_map(parent_map_url)
+            parent_map = shared_contacts(parent_map_url)
             parent_map.columns = parent_map.columns.str.strip()
             # Ensure "Parent Email" column exists, else fallback to any column containing "email"
             normalized_cols = [col.strip().lower() for col in parent_map.columns]
@@ -556,6 +734,7 @@ elif report_mode == "🗓️ Monthly Summary":
                         orig_col = full_report.columns[idx]
                         full_report.rename(columns={orig_col: "Parent Email"}, inplace=True)
                         break
+            full_report = apply_accepted_matches(full_report)
             chart_df = full_report.copy()
         else:
             # If no parent map, just use summary
@@ -619,11 +798,9 @@ elif report_mode == "🗓️ Monthly Summary":
             if not unmatched_students.empty:
                 st.subheader("⚠️ Students Without Parent Emails")
                 st.dataframe(unmatched_students)
-                st.download_button(
-                    "Download Missing Parent Emails CSV",
-                    data=unmatched_students.to_csv(index=False),
-                    file_name="missing_parent_emails.csv"
-                )
+                download_table("Download Missing Parent Emails", unmatched_students, "missing_parent_emails")
+                matched_ids = full_report.loc[full_report["Parent Email"].notnull(), "Login ID"]
+                show_match_proposals(unmatched_students, parent_map, matched_ids, key="monthly_match")
 
             st.subheader("📊 Summary")
             if "Parent Email" in full_report.columns:
@@ -656,14 +833,7 @@ elif report_mode == "🗓️ Monthly Summary":
                 preview_df["Valid Email"] = "❌"
                 st.warning("⚠️ 'Parent Email' column missing — unable to mark valid emails.")
             preview_df["Email Body"] = preview_df.apply(
-                lambda row: message_template.format(
-                    parent=row.get('Parent Name') if pd.notna(row.get('Parent Name')) else "Parent",
-                    student=row['Full Name'],
-                    worksheets=row.get("Worksheets This Week", row.get("Worksheets This Month", 0)),
-                    days=row.get("Study Days This Week", row.get("Study Days This Month", 0)),
-                    highest_ws=row['Highest WS Completed'],
-                    date_range=date_range_str
-                ), axis=1)
+                lambda row: format_email_body(message_template, row, date_range_str), axis=1)
             # Dynamically show checkboxes for each student
             with st.container():
                 st.markdown("**Check students to include in the email send list:**")
@@ -680,133 +850,21 @@ elif report_mode == "🗓️ Monthly Summary":
             test_mode = st.checkbox("Test Mode (Print emails to console only, do not send)", value=True)
 
             if st.button("Send Emails"):
-                progress_bar = st.progress(0)
-                total = len(preview_df.dropna(subset=["Parent Email"]))
-                email_log = []
-                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-                # Preview to self (always send, then print if test_mode)
-                if send_to_self:
-                    row = preview_df.iloc[0]
-                    body = message_template.format(
-                        parent=row.get('Parent Name', 'Parent'),
-                        student=row['Full Name'],
-                        worksheets=row.get("Worksheets This Week", row.get("Worksheets This Month", 0)),
-                        days=row.get("Study Days This Week", row.get("Study Days This Month", 0)),
-                        highest_ws=row['Highest WS Completed'],
-                        date_range=date_range_str
-                    )
-                    msg = MIMEMultipart()
-                    msg['From'] = sender_email
-                    msg['To'] = sender_email
-                    msg['Subject'] = subject_line
-                    msg.attach(MIMEText(body, 'plain'))
-                    try:
-                        server = smtplib.SMTP("smtp.gmail.com", 587)
-                        server.starttls()
-                        server.login(sender_email, sender_pass)
-                        server.send_message(msg)
-                        server.quit()
-                        if test_mode:
-                            st.write("📨 Preview email (to self):")
-                            st.code(body)
-                        else:
-                            st.success("✅ Preview email sent to yourself.")
-                        email_log.append({
-                            'Timestamp': timestamp,
-                            'Login ID': row['Login ID'],
-                            'Student': row['Full Name'],
-                            'Parent Email': sender_email,
-                            'Status': 'Preview to Self' + (' (Test Mode)' if test_mode else '')
-                        })
-                    except Exception as e:
-                        st.error(f"❌ Failed to send preview email to yourself: {e}")
-
-                # Now branch: test_mode or real send (excluding first row if send_to_self)
-                if test_mode:
-                    for i, (_, row) in enumerate(preview_df.iterrows()):
-                        print(f"TO: {row['Parent Email']}")
-                        body = message_template.format(
-                            parent=row.get('Parent Name', 'Parent'),
-                            student=row['Full Name'],
-                            worksheets=row.get("Worksheets This Week", row.get("Worksheets This Month", 0)),
-                            days=row.get("Study Days This Week", row.get("Study Days This Month", 0)),
-                            highest_ws=row['Highest WS Completed'],
-                            date_range=date_range_str
-                        )
-                        print(body)
-                        st.write(f"📨 Email to: {row['Parent Email']}")
-                        st.code(body)
-                        email_log.append({
-                            'Timestamp': timestamp,
-                            'Login ID': row['Login ID'],
-                            'Student': row['Full Name'],
-                            'Parent Email': row['Parent Email'],
-                            'Status': 'Test Mode'
-                        })
-                        progress_value = min((i + 1) / total, 1.0) if total else 1.0
-                        progress_bar.progress(progress_value)
-                    if email_log:
-                        email_log_df = pd.DataFrame(email_log)
-                        st.subheader("📜 Test Mode Email Log")
-                        st.dataframe(email_log_df)
-                    st.success("✅ Test mode: Emails printed to console.")
-                    st.balloons()
-                elif not send_to_self:
-                    try:
-                        server = smtplib.SMTP("smtp.gmail.com", 587)
-                        server.starttls()
-                        server.login(sender_email, sender_pass)
-                        failed_emails = []
-                        email_rows = preview_df.copy()
-                        if send_to_self:
-                            email_rows = email_rows.iloc[1:]
-                        for i, (_, row) in enumerate(email_rows.dropna(subset=["Parent Email"]).iterrows()):
-                            try:
-                                msg = MIMEMultipart()
-                                msg['From'] = sender_email
-                                msg['To'] = str(row['Parent Email'])
-                                msg['Subject'] = subject_line
-                                body = message_template.format(
-                                    parent=row.get('Parent Name', 'Parent'),
-                                    student=row['Full Name'],
-                                    worksheets=row.get("Worksheets This Week", row.get("Worksheets This Month", 0)),
-                                    days=row.get("Study Days This Week", row.get("Study Days This Month", 0)),
-                                    highest_ws=row['Highest WS Completed'],
-                                    date_range=date_range_str
-                                )
-                                msg.attach(MIMEText(body, 'plain'))
-                                server.send_message(msg)
-                                email_log.append({
-                                    'Timestamp': timestamp,
-                                    'Login ID': row['Login ID'],
-                                    'Student': row['Full Name'],
-                                    'Parent Email': row['Parent Email'],
-                                    'Status': 'Sent'
-                                })
-                            except Exception as e:
-                                failed_emails.append({
-                                    'Login ID': row.get('Login ID', ''),
-                                    'Full Name': row.get('Full Name', ''),
-                                    'Parent Name': row.get('Parent Name', ''),
-                                    'Parent Email': row.get('Parent Email', ''),
-                                    'Error': str(e)
-                                })
-                            progress_value = min((i + 1) / total, 1.0) if total else 1.0
-                            progress_bar.progress(progress_value)
-                        server.quit()
-                        if failed_emails:
-                            failed_df = pd.DataFrame(failed_emails)
-                            st.subheader("❌ Failed Email Report")
-                            st.dataframe(failed_df)
-                            st.download_button("Download Failed Emails CSV", data=failed_df.to_csv(index=False), file_name="failed_emails.csv")
-                        else:
-                            st.success("✅ Emails sent successfully!")
-                            st.balloons()
-                    except Exception as e:
-                        st.error(f"❌ Failed to send emails: {e}")
-                if email_log:
-                    email_log_df = pd.DataFrame(email_log)
-                    st.subheader("📜 Email Log")
-                    st.dataframe(email_log_df)
-                    st.download_button("Download Email Log", data=email_log_df.to_csv(index=False), file_name="email_log.csv")
+                submit_send_job(preview_df, sender_email, sender_pass, subject_line, send_to_self, test_mode)
+            show_send_status()
+
+# --- Download Everything ---
+if page_exports:
+    st.sidebar.download_button(
+        f"📦 Download All Tables ({export_format}, zip)",
+        data=lambda frames=dict(page_exports), fmt=export_format: export_zip(frames, fmt),
+        file_name="study_reports.zip",
+        mime="application/zip",
+        on_click="ignore"
+    )
+
+# --- Memory Accounting ---
+get_shared_store().end_run(session_key)
+
+if ADMIN_TOKEN and st.query_params.get("admin") == ADMIN_TOKEN:
+    show_memory_admin()
@@ -0,0 +1,77 @@
+import hashlib
+import io
+import threading
+import zipfile
+from collections import OrderedDict
+
+import pandas as pd
+
+# Download formats: file extension and MIME type
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Arrow": ("arrow", "application/vnd.apache.arrow.file"),
+}
+
+# Serialized files are shared by every session, up to this many bytes
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+_cache = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+
+def frame_fingerprint(df):
+    # Hashes every cell plus the column names and dtypes, so any edit changes it
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    digest.update(repr([(str(col), str(dtype)) for col, dtype in df.dtypes.items()]).encode())
+    return digest.hexdigest()
+
+
+def _arrow_ready(df):
+    # Report columns mix numbers and text (e.g. "Highest WS Completed"), which Arrow rejects
+    text_cols = df.select_dtypes(include="object").columns
+    return df.astype({col: "string" for col in text_cols}).reset_index(drop=True)
+
+
+def serialize(df, fmt):
+    if fmt == "CSV":
+        return df.to_csv(index=False).encode("utf-8")
+    buffer = io.BytesIO()
+    if fmt == "Parquet":
+        _arrow_ready(df).to_parquet(buffer, index=False)
+    elif fmt == "Arrow":
+        _arrow_ready(df).to_feather(buffer)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+    return buffer.getvalue()
+
+
+def export_bytes(df, fmt="CSV"):
+    """Serialized ``df`` in ``fmt``, reusing the cached copy if the frame is unchanged."""
+    global _cache_bytes
+    key = (frame_fingerprint(df), fmt)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    data = serialize(df, fmt)
+    with _cache_lock:
+        if key not in _cache:
+            _cache[key] = data
+            _cache_bytes += len(data)
+        while _cache_bytes > MAX_CACHE_BYTES and len(_cache) > 1:
+            _, evicted = _cache.popitem(last=False)
+            _cache_bytes -= len(evicted)
+    return data
+
+
+def export_zip(frames, fmt="CSV"):
+    """One zip holding every frame in ``frames`` (file stem -> DataFrame)."""
+    ext = EXPORT_FORMATS[fmt][0]
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for stem, df in frames.items():
+            archive.writestr(f"{stem}.{ext}", export_bytes(df, fmt))
+    return buffer.getvalue()
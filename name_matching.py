@@ -0,0 +1,184 @@
+import re
+import unicodedata
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+import pandas as pd
+
+# Formal name and the nicknames seen for it in the center rosters. Every name in a
+# group maps to the first, on both sides of a comparison. Nicknames shared by
+# several formal names (Chris, Alex, Sam, Max, Andy, Charlie...) are left out.
+NICKNAME_GROUPS = [
+    ("abigail", "abby"), ("benjamin", "ben"), ("william", "bill", "billy", "will"),
+    ("robert", "bob", "bobby"), ("daniel", "dan", "danny"), ("david", "dave"),
+    ("edward", "ed", "eddie"), ("elizabeth", "liz", "beth", "betty"), ("james", "jim", "jimmy"),
+    ("joseph", "joe", "joey"), ("jonathan", "jon"), ("katherine", "kate", "katie", "kathy"),
+    ("matthew", "matt"), ("michael", "mike", "mikey"), ("nicholas", "nick"),
+    ("steven", "steve"), ("thomas", "tom", "tommy"), ("anthony", "tony"), ("zachary", "zach"),
+    ("joshua", "josh"), ("jennifer", "jen", "jenny"), ("margaret", "meg", "maggie"),
+    ("nathan", "nate"), ("allison", "ally"), ("eleanor", "ellie"), ("gabriel", "gabe"),
+]
+NICKNAMES = {name: group[0] for group in NICKNAME_GROUPS for name in group}
+
+# Score cut-offs for the confidence levels shown in the app
+HIGH_CONFIDENCE = 0.9
+MEDIUM_CONFIDENCE = 0.75
+MIN_SCORE = 0.6
+# A runner-up (for a different parent) this close to the best score makes the suggestion ambiguous
+AMBIGUITY_MARGIN = 0.05
+
+SOUNDEX_CODES = {
+    ch: digit
+    for letters, digit in (("bfpv", "1"), ("cgjkqsxz", "2"), ("dt", "3"), ("l", "4"), ("mn", "5"), ("r", "6"))
+    for ch in letters
+}
+
+# Buckets larger than this are too generic to narrow anything down
+MAX_BLOCK_SIZE = 50
+
+
+def name_tokens(name):
+    if not isinstance(name, str):
+        return []
+    # Strip accents, punctuation and case so "José O'Neil" == "jose oneil"
+    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    name = re.sub(r"['\.]", "", name.lower())
+    return [t for t in re.split(r"[^a-z]+", name) if t]
+
+
+def canonical_tokens(tokens):
+    return [NICKNAMES.get(t, t) for t in tokens]
+
+
+def soundex(token):
+    if not token:
+        return ""
+    codes = SOUNDEX_CODES
+    key = token[0].upper()
+    last = codes.get(token[0], "")
+    for ch in token[1:]:
+        digit = codes.get(ch, "")
+        if digit and digit != last:
+            key += digit
+        if ch not in "hw":
+            last = digit
+    return (key + "000")[:4]
+
+
+def blocking_keys(tokens):
+    # Order-independent keys, so "Smith, John" and "John Smith" land in the same buckets
+    keys = {"set:" + " ".join(sorted(tokens))} if tokens else set()
+    for token in tokens:
+        keys.add("sx:" + soundex(token))
+        if len(token) >= 3:
+            keys.add("pre:" + token[:3])
+    return keys
+
+
+def score_names(tokens_a, tokens_b):
+    if not tokens_a or not tokens_b:
+        return 0.0
+    set_a, set_b = set(tokens_a), set(tokens_b)
+    if set_a == set_b:
+        return 1.0
+    jaccard = len(set_a & set_b) / len(set_a | set_b)
+    # Compare sorted tokens so swapped first/last names still line up
+    sorted_ratio = SequenceMatcher(None, " ".join(sorted(tokens_a)), " ".join(sorted(tokens_b))).ratio()
+    sx_a = {soundex(t) for t in tokens_a}
+    sx_b = {soundex(t) for t in tokens_b}
+    phonetic = len(sx_a & sx_b) / len(sx_a | sx_b)
+    return round(0.5 * sorted_ratio + 0.3 * phonetic + 0.2 * jaccard, 3)
+
+
+def best_score(tokens_a, tokens_b):
+    # Nickname expansion can hurt as well as help ("Jon" vs "John"), so keep the better score
+    return max(score_names(tokens_a, tokens_b), score_names(canonical_tokens(tokens_a), canonical_tokens(tokens_b)))
+
+
+def confidence_level(score):
+    if score >= HIGH_CONFIDENCE:
+        return "High"
+    if score >= MEDIUM_CONFIDENCE:
+        return "Medium"
+    return "Low"
+
+
+class NameIndex:
+    """Blocking index over the student names in the parent contact sheet."""
+
+    def __init__(self, names):
+        self.tokens = [name_tokens(n) for n in names]
+        self.blocks = defaultdict(list)
+        for pos, tokens in enumerate(self.tokens):
+            for key in blocking_keys(tokens) | blocking_keys(canonical_tokens(tokens)):
+                self.blocks[key].append(pos)
+
+    def candidates(self, tokens):
+        found = set()
+        for key in blocking_keys(tokens) | blocking_keys(canonical_tokens(tokens)):
+            bucket = self.blocks.get(key, ())
+            if len(bucket) <= MAX_BLOCK_SIZE or key.startswith("set:"):
+                found.update(bucket)
+        return found
+
+    def ranked_matches(self, name):
+        # (position, score) pairs for every candidate, best first
+        tokens = name_tokens(name)
+        scored = [(pos, best_score(tokens, self.tokens[pos])) for pos in self.candidates(tokens)]
+        return sorted(scored, key=lambda match: match[1], reverse=True)
+
+
+def find_name_column(parent_map):
+    if "Full Name" in parent_map.columns:
+        return "Full Name"
+    for col in parent_map.columns:
+        col_lc = col.strip().lower()
+        if "name" in col_lc and "parent" not in col_lc:
+            return col
+    return None
+
+
+def propose_matches(unmatched, parent_map, matched_ids=(), name_col="Full Name"):
+    """Suggest a parent contact row for each unmatched student by fuzzy name.
+
+    Contacts whose Login ID is in ``matched_ids`` already belong to a student
+    in the report and are never suggested. Returns one row per student that
+    scored at least ``MIN_SCORE``, with the matched name, parent details, score
+    and confidence; a close runner-up for a different parent marks the
+    suggestion "Ambiguous".
+    """
+    columns = ["Login ID", "Full Name", "Matched Name", "Parent Name", "Parent Email", "Score", "Confidence", "Runner-up"]
+    sheet_name_col = find_name_column(parent_map)
+    if unmatched.empty or sheet_name_col is None or "Parent Email" not in parent_map.columns:
+        return pd.DataFrame(columns=columns)
+
+    contacts = parent_map.dropna(subset=["Parent Email"])
+    if "Login ID" in contacts.columns:
+        contacts = contacts[~contacts["Login ID"].astype(str).isin({str(i) for i in matched_ids})]
+    contacts = contacts.reset_index(drop=True)
+    index = NameIndex(contacts[sheet_name_col].tolist())
+    proposals = []
+    for _, row in unmatched.iterrows():
+        ranked = index.ranked_matches(row[name_col])
+        if not ranked or ranked[0][1] < MIN_SCORE:
+            continue
+        pos, score = ranked[0]
+        contact = contacts.iloc[pos]
+        runner_up, runner_up_score = next(
+            ((contacts.iloc[other], other_score) for other, other_score in ranked[1:]
+             if contacts.iloc[other]["Parent Email"] != contact["Parent Email"]),
+            (None, 0.0)
+        )
+        ambiguous = runner_up is not None and score - runner_up_score <= AMBIGUITY_MARGIN
+        proposals.append({
+            "Login ID": row.get("Login ID", ""),
+            "Full Name": row[name_col],
+            "Matched Name": contact[sheet_name_col],
+            "Parent Name": contact.get("Parent Name", ""),
+            "Parent Email": contact["Parent Email"],
+            "Score": score,
+            "Confidence": "Ambiguous" if ambiguous else confidence_level(score),
+            "Runner-up": f"{runner_up[sheet_name_col]} ({runner_up_score:.2f})" if ambiguous else "",
+        })
+    proposals = pd.DataFrame(proposals, columns=columns)
+    return proposals.sort_values("Score", ascending=False, ignore_index=True)
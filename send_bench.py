@@ -0,0 +1,135 @@
+"""Throughput and soak harness for the email send path.
+
+Starts a local smtp_sink.py server, runs a batch through the same SendWorker
+and SendJob the app uses, then reports messages/sec, per-message latency and
+whether the email log and failed-email report account for every message:
+
+    python send_bench.py --messages 500 --latency-ms 20 --fail-4xx 0.02 --drop-rate 0.005
+    python send_bench.py --scenario preview
+    python send_bench.py --soak 10 --messages 200 --fail-5xx 0.05
+
+Exits non-zero if any accounting check fails.
+"""
+import argparse
+import contextlib
+import io
+import sys
+import time
+from collections import Counter
+
+from send_worker import SendJob, SendWorker
+from smtp_sink import SMTPSink, add_fault_arguments, config_from_args
+
+SENDER = "center@example.com"
+
+
+def fake_emails(count):
+    return [{
+        'Login ID': f"L{i:05d}",
+        'Full Name': f"Student {i}",
+        'Parent Name': f"Parent {i}",
+        'Parent Email': f"parent{i}@example.com",
+        'Body': f"Dear Parent {i},\n\nHere is the weekly study update for Student {i}.\n"
+    } for i in range(count)]
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def run_batch(sink, scenario, count, timeout):
+    # Build the job the same way the app's submit_send_job does for each mode
+    emails = fake_emails(count)
+    if scenario == "preview":
+        job = SendJob(SENDER, "app-password", "Weekly Progress", [], preview=emails[0], test_mode=False,
+                      host="localhost", port=sink.port)
+    else:
+        job = SendJob(SENDER, "app-password", "Weekly Progress", emails, test_mode=(scenario == "test"),
+                      host="localhost", port=sink.port)
+    worker = SendWorker()
+    started = time.perf_counter()
+    # Test mode prints every email; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        worker.submit(job)
+        while not job.finished:
+            if time.perf_counter() - started > timeout:
+                break
+            time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    worker.executor.shutdown(wait=False)
+    return job, elapsed
+
+
+def check_accounting(job, sink, scenario, accepted_before):
+    snap = job.snapshot()
+    statuses = Counter(entry['Status'] for entry in snap['email_log'])
+    logged_sent = [entry['Parent Email'] for entry in snap['email_log'] if entry['Status'] in ('Sent', 'Preview to Self')]
+    accepted = [rcpt for _, _, rcpts, _ in sink.received()[accepted_before:] for rcpt in rcpts]
+    failed_ids = {row['Login ID'] for row in snap['failed_emails']}
+    sent_ids = {entry['Login ID'] for entry in snap['email_log'] if entry['Status'] == 'Sent'}
+
+    checks = [("job finished", snap['status'] in ("done", "failed"))]
+    if scenario == "send":
+        checks += [
+            ("every message attempted", snap['done'] == snap['total']),
+            ("sent + failed == total", statuses['Sent'] + len(snap['failed_emails']) == snap['total']),
+            ("no message both sent and failed", not (failed_ids & sent_ids)),
+            ("every failure has an error", all(row['Error'] for row in snap['failed_emails'])),
+        ]
+    elif scenario == "test":
+        checks.append(("every message logged", statuses['Test Mode'] == snap['total']))
+    # Messages the sink accepted must be exactly the ones logged as sent
+    checks.append(("log matches server-accepted mail", Counter(logged_sent) == Counter(accepted)))
+    return checks, statuses
+
+
+def print_report(job, elapsed, checks, statuses, outcomes):
+    snap = job.snapshot()
+    times_ms = [t * 1000 for t in job.send_times]
+    print(f"Job {snap['id']}: {snap['status']} in {elapsed:.2f}s")
+    print(f"  messages/sec     {snap['done'] / elapsed if elapsed else 0:.1f}")
+    if times_ms:
+        print(f"  latency ms       p50 {percentile(times_ms, 50):.1f}  p90 {percentile(times_ms, 90):.1f}  "
+              f"p99 {percentile(times_ms, 99):.1f}  max {max(times_ms):.1f}")
+    print(f"  email log        {dict(statuses)}")
+    print(f"  failed emails    {len(snap['failed_emails'])}")
+    print(f"  server outcomes  {dict(outcomes)}")
+    for level, text in snap['notices']:
+        print(f"  {level:<16} {text}")
+    for name, ok in checks:
+        print(f"  [{'PASS' if ok else 'FAIL'}] {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send-path throughput and fault harness")
+    parser.add_argument("--scenario", choices=["send", "test", "preview"], default="send",
+                        help="real send, test mode, or preview-to-self only")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--soak", type=int, default=1, help="number of back-to-back batches")
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds to wait for each batch")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    sink = SMTPSink(config=config_from_args(args)).start()
+    all_ok = True
+    try:
+        for batch in range(args.soak):
+            accepted_before = len(sink.received())
+            outcomes_before = len(sink.messages)
+            job, elapsed = run_batch(sink, args.scenario, args.messages, args.timeout)
+            checks, statuses = check_accounting(job, sink, args.scenario, accepted_before)
+            outcomes = Counter(outcome for outcome, *_ in sink.messages[outcomes_before:])
+            if args.soak > 1:
+                print(f"Batch {batch + 1}/{args.soak}")
+            print_report(job, elapsed, checks, statuses, outcomes)
+            all_ok = all_ok and all(ok for _, ok in checks)
+    finally:
+        sink.stop()
+    sys.exit(0 if all_ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import os
+import smtplib
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+# Overridable so the app can be pointed at a local server such as smtp_sink.py
+SMTP_HOST = os.environ.get("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", 587))
+
+# Finished jobs kept around so their logs can still be viewed and downloaded
+MAX_FINISHED_JOBS = 50
+# Senders whose batches can run at the same time; each sender's own jobs still run one by one
+SEND_WORKER_THREADS = int(os.environ.get("SEND_WORKER_THREADS", 4))
+
+
+def build_message(sender_email, to, subject, body):
+    msg = MIMEMultipart()
+    msg['From'] = sender_email
+    msg['To'] = str(to)
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
+
+
+class SendJob:
+    """One batch of parent emails, run on the server's send worker.
+
+    ``emails`` is a list of dicts with ``Login ID``, ``Full Name``,
+    ``Parent Name``, ``Parent Email`` and ``Body``. ``preview`` is an optional
+    email of the same shape that is sent to the sender first.
+    """
+
+    def __init__(self, sender_email, sender_pass, subject, emails, preview=None, test_mode=True,
+                 host=SMTP_HOST, port=SMTP_PORT):
+        # The full ID is what reopens the job from a page link, so it must not be guessable
+        self.id = uuid.uuid4().hex
+        self.sender_email = sender_email
+        self.sender_pass = sender_pass
+        self.subject = subject
+        self.emails = emails
+        self.preview = preview
+        self.test_mode = test_mode
+        self.host = host
+        self.port = port
+        self.timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.status = "queued"
+        self.done = 0
+        self.email_log = []
+        self.failed_emails = []
+        self.test_output = []
+        # Seconds each real send took, for throughput measurements
+        self.send_times = []
+        # (level, text) pairs shown by the status panel, level is an st.* method name
+        self.notices = []
+        self.lock = threading.Lock()
+
+    @property
+    def total(self):
+        return len(self.emails)
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'id': self.id,
+                'status': self.status,
+                'timestamp': self.timestamp,
+                'test_mode': self.test_mode,
+                'done': self.done,
+                'total': self.total,
+                'email_log': list(self.email_log),
+                'failed_emails': list(self.failed_emails),
+                'test_output': list(self.test_output),
+                'notices': list(self.notices),
+            }
+
+    def _log(self, email, parent_email, status):
+        self.email_log.append({
+            'Timestamp': self.timestamp,
+            'Login ID': email['Login ID'],
+            'Student': email['Full Name'],
+            'Parent Email': parent_email,
+            'Status': status
+        })
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port)
+        server.starttls()
+        server.login(self.sender_email, self.sender_pass)
+        return server
+
+    def run(self):
+        with self.lock:
+            self.status = "running"
+        try:
+            if self.preview is not None:
+                self._send_preview()
+            if self.test_mode:
+                self._print_all()
+            elif self.emails:
+                self._send_all()
+        except Exception as e:
+            with self.lock:
+                self.notices.append(("error", f"❌ Failed to send emails: {e}"))
+                self.status = "failed"
+            return
+        finally:
+            # Finished jobs stay in memory for their logs; the password doesn't need to
+            self.sender_pass = None
+        with self.lock:
+            self.status = "done"
+
+    def _send_preview(self):
+        # Preview to self (always send, then print if test_mode)
+        msg = build_message(self.sender_email, self.sender_email, self.subject, self.preview['Body'])
+        try:
+            server = self._connect()
+            server.send_message(msg)
+            server.quit()
+        except Exception as e:
+            with self.lock:
+                self.notices.append(("error", f"❌ Failed to send preview email to yourself: {e}"))
+            return
+        with self.lock:
+            if self.test_mode:
+                self.test_output.append(("Preview email (to self)", self.preview['Body']))
+            else:
+                self.notices.append(("success", "✅ Preview email sent to yourself."))
+            self._log(self.preview, self.sender_email, 'Preview to Self' + (' (Test Mode)' if self.test_mode else ''))
+
+    def _print_all(self):
+        for email in self.emails:
+            print(f"TO: {email['Parent Email']}")
+            print(email['Body'])
+            with self.lock:
+                self.test_output.append((f"Email to: {email['Parent Email']}", email['Body']))
+                self._log(email, email['Parent Email'], 'Test Mode')
+                self.done += 1
+        with self.lock:
+            self.notices.append(("success", "✅ Test mode: Emails printed to console."))
+
+    def _send_all(self):
+        server = self._connect()
+        for email in self.emails:
+            started = time.perf_counter()
+            msg = build_message(self.sender_email, email['Parent Email'], self.subject, email['Body'])
+            try:
+                try:
+                    server.send_message(msg)
+                except smtplib.SMTPServerDisconnected:
+                    # The connection dropped (idle timeout, server restart); reconnect once and retry this message
+                    server = self._connect()
+                    server.send_message(msg)
+                with self.lock:
+                    self.send_times.append(time.perf_counter() - started)
+                    self._log(email, email['Parent Email'], 'Sent')
+            except Exception as e:
+                with self.lock:
+                    self.send_times.append(time.perf_counter() - started)
+                    self.failed_emails.append({
+                        'Login ID': email.get('Login ID', ''),
+                        'Full Name': email.get('Full Name', ''),
+                        'Parent Name': email.get('Parent Name', ''),
+                        'Parent Email': email.get('Parent Email', ''),
+                        'Error': str(e)
+                    })
+            with self.lock:
+                self.done += 1
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            # Every message has been handed over already; a failed goodbye doesn't change that
+            pass
+        with self.lock:
+            if not self.failed_emails:
+                self.notices.append(("success", "✅ Emails sent successfully!"))
+
+
+class SendWorker:
+    """Runs send jobs on a small pool of background threads.
+
+    Jobs are queued per sender account, so one account is never logged in
+    twice at once, while a long batch from one sender doesn't hold up another
+    sender's jobs. The worker lives as long as the server process, so a batch
+    keeps going when the page reruns or the browser is refreshed.
+    """
+
+    def __init__(self, threads=SEND_WORKER_THREADS):
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="send-worker")
+        self.jobs = OrderedDict()
+        # sender -> jobs waiting for that sender, the running one first
+        self.queues = {}
+        self.lock = threading.Lock()
+
+    def submit(self, job):
+        sender = job.sender_email.strip().lower()
+        with self.lock:
+            self.jobs[job.id] = job
+            finished = [job_id for job_id, j in self.jobs.items() if j.finished]
+            for job_id in finished[:max(len(finished) - MAX_FINISHED_JOBS, 0)]:
+                del self.jobs[job_id]
+            queue = self.queues.setdefault(sender, deque())
+            queue.append(job)
+            idle = len(queue) == 1
+        if idle:
+            self.executor.submit(self._drain, sender)
+        return job.id
+
+    def _drain(self, sender):
+        # Run this sender's jobs back to back on one pool thread
+        while True:
+            with self.lock:
+                job = self.queues[sender][0]
+            try:
+                job.run()
+            finally:
+                with self.lock:
+                    queue = self.queues[sender]
+                    queue.popleft()
+                    if not queue:
+                        del self.queues[sender]
+                        return
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
@@ -0,0 +1,213 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+# Limits, overridable per deployment
+SHARED_STORE_CAP_MB = float(os.environ.get("SHARED_STORE_CAP_MB", 512))
+SESSION_MEMORY_CAP_MB = float(os.environ.get("SESSION_MEMORY_CAP_MB", 200))
+SESSION_IDLE_MINUTES = float(os.environ.get("SESSION_IDLE_MINUTES", 60))
+
+MB = 1024 * 1024
+
+
+def frame_bytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class SharedEntry:
+    def __init__(self, value, kind, label, expires_at):
+        self.value = value
+        self.nbytes = frame_bytes(value)
+        self.kind = kind
+        self.label = label
+        self.expires_at = expires_at
+        self.sessions = set()
+        self.last_used = time.time()
+
+
+class SessionUsage:
+    def __init__(self):
+        # slot name -> shared entry key, e.g. "last" -> "csv:<digest>"
+        self.slots = {}
+        self.used_slots = set()
+        # private name -> bytes this session holds on its own
+        self.private = {}
+        self.last_seen = time.time()
+
+
+class SharedStore:
+    """Read-only DataFrames shared by every session, with per-session accounting.
+
+    Identical uploads and contact sheets are parsed once and handed out as
+    shallow copies, so sessions can add or rename columns without touching the
+    shared data. Each session binds entries to named slots; an entry's
+    reference count is the number of sessions holding it, and unreferenced
+    entries are evicted least-recently-used first once the store is over its
+    cap. Sessions that go quiet for ``idle_minutes`` release their references.
+    """
+
+    def __init__(self, cap_mb=SHARED_STORE_CAP_MB, session_cap_mb=SESSION_MEMORY_CAP_MB,
+                 idle_minutes=SESSION_IDLE_MINUTES):
+        self.cap_bytes = cap_mb * MB
+        self.session_cap_bytes = session_cap_mb * MB
+        self.idle_seconds = idle_minutes * 60
+        self.entries = OrderedDict()
+        self.sessions = {}
+        self.lock = threading.RLock()
+
+    def _session(self, session_id):
+        usage = self.sessions.get(session_id)
+        if usage is None:
+            usage = self.sessions[session_id] = SessionUsage()
+        usage.last_seen = time.time()
+        return usage
+
+    def begin_run(self, session_id):
+        # Private usage is re-recorded on every run; slots not used again are released in end_run
+        with self.lock:
+            usage = self._session(session_id)
+            usage.used_slots = set()
+            usage.private = {}
+            self._prune_idle()
+
+    def end_run(self, session_id):
+        with self.lock:
+            usage = self._session(session_id)
+            for slot in list(usage.slots):
+                if slot not in usage.used_slots:
+                    self._unbind(session_id, usage, slot)
+            self._evict()
+
+    def get_or_create(self, session_id, slot, key, build, kind, label, ttl=None):
+        """Shallow copy of the shared frame under ``key``, building it if needed."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.expires_at is not None and entry.expires_at < time.time():
+                self._drop(key)
+                entry = None
+        if entry is None:
+            # Build outside the lock so a slow download doesn't block other sessions
+            value = build()
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is None:
+                    entry = SharedEntry(value, kind, label, time.time() + ttl if ttl else None)
+                    self.entries[key] = entry
+        with self.lock:
+            # Another session may have evicted it while this one was building
+            entry = self.entries.setdefault(key, entry)
+            usage = self._session(session_id)
+            if usage.slots.get(slot) != key:
+                self._unbind(session_id, usage, slot)
+                usage.slots[slot] = key
+            entry.sessions.add(session_id)
+            entry.last_used = time.time()
+            usage.used_slots.add(slot)
+            self.entries.move_to_end(key)
+            self._evict()
+            return entry.value.copy(deep=False)
+
+    def release(self, session_id, slot):
+        with self.lock:
+            usage = self.sessions.get(session_id)
+            if usage is not None:
+                self._unbind(session_id, usage, slot)
+
+    def release_run(self, session_id):
+        # Unbind every slot this run used, e.g. when it is stopped for being over its cap.
+        # Private sizes stay recorded: the session still holds that data until its next run
+        with self.lock:
+            usage = self.sessions.get(session_id)
+            if usage is not None:
+                for slot in list(usage.used_slots):
+                    self._unbind(session_id, usage, slot)
+                usage.used_slots = set()
+                self._evict()
+
+    def invalidate(self, label):
+        # Drop entries built from ``label`` (e.g. a contact sheet URL) so the next read rebuilds them
+        with self.lock:
+            for key in [key for key, entry in self.entries.items() if entry.label == label]:
+                self._drop(key)
+
+    def set_private(self, session_id, name, nbytes):
+        with self.lock:
+            self._session(session_id).private[name] = int(nbytes)
+
+    def session_usage(self, session_id, current_run=False):
+        # current_run leaves out slots from the previous run that haven't been used again yet
+        with self.lock:
+            usage = self.sessions.get(session_id) or SessionUsage()
+            slots = usage.used_slots if current_run else usage.slots
+            shared = fair_share = 0
+            for key in {usage.slots[slot] for slot in slots if slot in usage.slots}:
+                entry = self.entries.get(key)
+                if entry is not None:
+                    shared += entry.nbytes
+                    fair_share += entry.nbytes / max(len(entry.sessions), 1)
+            private = sum(usage.private.values())
+            return {
+                'private': private,
+                'shared': shared,
+                # Shared entries are charged to a session split evenly among their users
+                'charged': private + fair_share,
+                'last_seen': usage.last_seen,
+            }
+
+    def over_cap(self, session_id):
+        return self.session_usage(session_id, current_run=True)['charged'] > self.session_cap_bytes
+
+    def stats(self):
+        with self.lock:
+            entries = pd.DataFrame([{
+                'Key': key[:20],
+                'Kind': entry.kind,
+                'Label': entry.label,
+                'MB': round(entry.nbytes / MB, 3),
+                'Sessions': len(entry.sessions),
+                'Last Used': time.strftime("%H:%M:%S", time.localtime(entry.last_used)),
+            } for key, entry in self.entries.items()])
+            sessions = pd.DataFrame([{
+                'Session': session_id,
+                'Private MB': round(usage['private'] / MB, 3),
+                'Shared MB': round(usage['shared'] / MB, 3),
+                'Charged MB': round(usage['charged'] / MB, 3),
+                'Over Cap': usage['charged'] > self.session_cap_bytes,
+                'Last Seen': time.strftime("%H:%M:%S", time.localtime(usage['last_seen'])),
+            } for session_id, usage in ((sid, self.session_usage(sid)) for sid in self.sessions)])
+            total = sum(entry.nbytes for entry in self.entries.values())
+            return entries, sessions, total
+
+    def _unbind(self, session_id, usage, slot):
+        key = usage.slots.pop(slot, None)
+        if key is None or key in usage.slots.values():
+            return
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry.sessions.discard(session_id)
+
+    def _drop(self, key):
+        self.entries.pop(key)
+        for usage in self.sessions.values():
+            for slot in [slot for slot, k in usage.slots.items() if k == key]:
+                del usage.slots[slot]
+
+    def _prune_idle(self):
+        cutoff = time.time() - self.idle_seconds
+        for session_id in [sid for sid, usage in self.sessions.items() if usage.last_seen < cutoff]:
+            usage = self.sessions.pop(session_id)
+            for slot in list(usage.slots):
+                self._unbind(session_id, usage, slot)
+
+    def _evict(self):
+        total = sum(entry.nbytes for entry in self.entries.values())
+        for key in list(self.entries):
+            if total <= self.cap_bytes:
+                break
+            entry = self.entries[key]
+            if not entry.sessions:
+                total -= entry.nbytes
+                self._drop(key)
@@ -0,0 +1,219 @@
+import io
+import os
+import re
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+import pandas as pd
+
+from name_matching import find_name_column
+
+# Overridable so a local HTTP server can stand in for Google Sheets
+SHEETS_BASE_URL = os.environ.get("SHEETS_BASE_URL", "https://docs.google.com")
+
+# Login IDs per query; keeps the query URL well under Google's length limit
+ID_BATCH_SIZE = 100
+# Rows fetched alongside the header when working out which column is which
+SCHEMA_SAMPLE_ROWS = 20
+SCHEMA_TTL_SECONDS = 3600
+
+_schema_cache = {}
+_schema_lock = threading.Lock()
+
+
+def parse_sheet_url(url):
+    """``(sheet_id, gid)`` for a Google Sheets link, or None for any other URL."""
+    if "docs.google.com/spreadsheets" not in url:
+        return None
+    sheet_id_match = re.search(r"/d/([a-zA-Z0-9-_]+)", url)
+    if not sheet_id_match:
+        return None
+    gid_match = re.search(r"[#&?]gid=(\d+)", url)
+    return sheet_id_match.group(1), gid_match.group(1) if gid_match else None
+
+
+def gviz_url(sheet_id, gid, query):
+    params = {"tqx": "out:csv", "headers": "1", "tq": query}
+    if gid:
+        params["gid"] = gid
+    return f"{SHEETS_BASE_URL}/spreadsheets/d/{sheet_id}/gviz/tq?{urllib.parse.urlencode(params)}"
+
+
+def export_url(sheet_id, gid):
+    url = f"{SHEETS_BASE_URL}/spreadsheets/d/{sheet_id}/export?format=csv"
+    return url + f"&gid={gid}" if gid else url
+
+
+def read_export_head(sheet_id, gid, rows):
+    # The plain CSV export keeps every cell as typed; only the first rows are parsed
+    with urllib.request.urlopen(export_url(sheet_id, gid), timeout=30) as response:
+        return pd.read_csv(response, dtype=str, nrows=rows)
+
+
+def read_gviz_csv(url):
+    with urllib.request.urlopen(url, timeout=30) as response:
+        body = response.read()
+    # A private sheet or a bad query comes back as an HTML page, not CSV
+    if body.lstrip()[:1] == b"<":
+        raise ValueError("Google Sheets did not return CSV data")
+    return pd.read_csv(io.BytesIO(body), dtype=str)
+
+
+def column_letter(index):
+    letters = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+def detect_columns(sample):
+    """Map our column names to the sheet's header labels, from a sample of rows."""
+    normalized = {col: col.strip().lower() for col in sample.columns}
+    found = {}
+    for col, col_lc in normalized.items():
+        if col_lc == "login id":
+            found["Login ID"] = col
+        elif col_lc == "parent email":
+            found["Parent Email"] = col
+        elif col_lc == "parent name":
+            found["Parent Name"] = col
+    # Same fallbacks as load_parent_map: an "email" header, then a column of mostly addresses
+    if "Parent Email" not in found:
+        for col, col_lc in normalized.items():
+            if "email" in col_lc:
+                found["Parent Email"] = col
+                break
+    if "Parent Email" not in found:
+        for col, col_lc in normalized.items():
+            if col_lc in ("full name", "login id"):
+                continue
+            series = sample[col].dropna().astype(str)
+            if len(series) and series.str.contains("@").sum() > len(series) / 2:
+                found["Parent Email"] = col
+                break
+    name_col = find_name_column(sample)
+    if name_col is not None:
+        found["Full Name"] = name_col
+    return found
+
+
+def blanked_columns(sample, head, positions):
+    """Columns where gviz returned fewer values than the plain export has.
+
+    gviz gives each column a single type and blanks every cell of another type,
+    e.g. a text Login ID in a mostly numeric column.
+    """
+    rows = min(len(sample), len(head))
+    return [
+        pos for pos in positions
+        if pos < head.shape[1] and sample.iloc[:rows, pos].notna().sum() < head.iloc[:rows, pos].notna().sum()
+    ]
+
+
+def resolve_schema(sheet_id, gid):
+    """Column letters and sheet labels for Login ID, names and parent email.
+
+    Resolved from the header and a few sample rows, then cached per sheet tab.
+    Returns None when the sheet has no Login ID or parent email column, or when
+    one of them mixes value types that gviz would blank out.
+    """
+    key = (SHEETS_BASE_URL, sheet_id, gid)
+    with _schema_lock:
+        cached = _schema_cache.get(key)
+    if cached and time.time() - cached["resolved_at"] < SCHEMA_TTL_SECONDS:
+        return cached["schema"]
+
+    sample = read_gviz_csv(gviz_url(sheet_id, gid, f"SELECT * LIMIT {SCHEMA_SAMPLE_ROWS}"))
+    sample.columns = [str(col) for col in sample.columns]
+    found = detect_columns(sample)
+    schema = None
+    positions = {col: idx for idx, col in enumerate(sample.columns)}
+    if "Login ID" in found and "Parent Email" in found and not blanked_columns(
+        sample, read_export_head(sheet_id, gid, SCHEMA_SAMPLE_ROWS), [positions[col] for col in found.values()]
+    ):
+        ids = sample[found["Login ID"]].dropna()
+        schema = {
+            "columns": {name: (column_letter(positions[col]), col) for name, col in found.items()},
+            # Numeric ID columns need unquoted literals in the WHERE clause
+            "numeric_ids": bool(len(ids) > 0 and ids.str.fullmatch(r"\d+(\.0+)?").all()),
+        }
+    with _schema_lock:
+        _schema_cache[key] = {"schema": schema, "resolved_at": time.time()}
+    return schema
+
+
+def clear_schema_cache(url=None):
+    parsed = parse_sheet_url(url) if url else None
+    with _schema_lock:
+        if parsed is None:
+            _schema_cache.clear()
+        else:
+            _schema_cache.pop((SHEETS_BASE_URL, *parsed), None)
+
+
+def id_literal(login_id, numeric):
+    # None when the ID isn't of the column's type; gviz would have blanked such a cell anyway
+    is_number = re.fullmatch(r"\d+(\.0+)?", login_id) is not None
+    if numeric:
+        return str(int(float(login_id))) if is_number else None
+    return None if is_number else "'" + login_id.replace("'", "") + "'"
+
+
+def fetch_parent_contacts(url, login_ids=None):
+    """Only the contact columns (and optionally rows) the report needs.
+
+    Uses the Sheets gviz query endpoint to select the Login ID, student name,
+    parent name and parent email columns, filtered to ``login_ids`` when given.
+    Returns None when the URL isn't a Google Sheet, the columns can't be
+    identified or gviz blanked some Login IDs, so the caller can fall back to
+    downloading the whole sheet.
+    """
+    parsed = parse_sheet_url(url)
+    if parsed is None:
+        return None
+    sheet_id, gid = parsed
+    try:
+        schema = resolve_schema(sheet_id, gid)
+    except Exception:
+        return None
+    if schema is None:
+        return None
+
+    columns = schema["columns"]
+    letters = [letter for letter, _ in columns.values()]
+    select = "SELECT " + ", ".join(letters)
+    renames = {label: name for name, (_, label) in columns.items()}
+    id_letter = columns["Login ID"][0]
+
+    literals = None
+    if login_ids is not None:
+        literals = {id_literal(str(i), schema["numeric_ids"]) for i in login_ids}
+    # An ID that can't be written as a literal can't be filtered on, so take every
+    # row instead; if its cell was blanked, the check below falls back to the export
+    if literals is None or None in literals:
+        queries = [select]
+    else:
+        literals = sorted(literals)
+        queries = [
+            select + " WHERE " + " OR ".join(f"{id_letter} = {lit}" for lit in literals[start:start + ID_BATCH_SIZE])
+            for start in range(0, len(literals), ID_BATCH_SIZE)
+        ]
+    try:
+        frames = [read_gviz_csv(gviz_url(sheet_id, gid, query)) for query in queries]
+    except Exception:
+        return None
+    if not frames:
+        return pd.DataFrame(columns=list(columns))
+    contacts = pd.concat(frames, ignore_index=True)
+    # gviz labels the projected columns with their header text
+    contacts.columns = [renames.get(str(col), col) for col in contacts.columns]
+    # A row with details but no Login ID is one gviz blanked for being of the
+    # column's minority type past the schema sample; the full export has the ID
+    details = contacts.drop(columns="Login ID").notna().any(axis=1)
+    if (contacts["Login ID"].isna() & details).any():
+        return None
+    return contacts
@@ -0,0 +1,174 @@
+"""Local stand-in for the Google Sheets endpoints the app reads contacts from.
+
+Serves one CSV file as every sheet and tab, through the gviz query endpoint
+(SELECT with column letters, WHERE ... OR ..., LIMIT) and the plain CSV export.
+Like gviz, queries give each column the type most of its cells have and blank
+the rest, so mixed-type columns can be tested offline. Run it directly and
+point the app at it:
+
+    python sheets_stub.py contacts.csv --port 8765
+    SHEETS_BASE_URL=http://localhost:8765 streamlit run app.py
+
+Any https://docs.google.com/spreadsheets/d/<id>/edit link then reads from the stub.
+"""
+import argparse
+import re
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+QUERY_RE = re.compile(r"SELECT (.+?)(?: WHERE (.+?))?(?: LIMIT (\d+))?$", re.IGNORECASE)
+
+
+def column_index(letters):
+    index = 0
+    for ch in letters.strip().upper():
+        index = index * 26 + ord(ch) - ord("A") + 1
+    return index - 1
+
+
+def is_number(value):
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
+
+
+def typed_view(sheet):
+    """The sheet as gviz sees it: one type per column, other cells blanked."""
+    typed = sheet.copy()
+    numeric = {}
+    for col in sheet.columns:
+        values = sheet[col].dropna()
+        is_numeric = values.map(is_number)
+        numeric[col] = bool(len(values)) and is_numeric.sum() > len(values) / 2
+        minority = is_numeric != numeric[col]
+        typed.loc[minority[minority].index, col] = None
+    return typed, numeric
+
+
+class SheetsHandler(BaseHTTPRequestHandler):
+    def send_csv(self, frame):
+        body = frame.to_csv(index=False).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_page(self, message):
+        # gviz reports bad queries and private sheets as an HTML page with a 200 status
+        body = f"<html><body>{message}</body></html>".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parsed = urllib.parse.urlparse(self.path)
+        params = urllib.parse.parse_qs(parsed.query)
+        if parsed.path.endswith("/export"):
+            self.server.log("export", parsed.query)
+            self.send_csv(self.server.sheet)
+        elif parsed.path.endswith("/gviz/tq"):
+            query = params.get("tq", [""])[0]
+            self.server.log("gviz", query)
+            try:
+                self.send_csv(self.server.run_query(query))
+            except ValueError as e:
+                self.send_error_page(str(e))
+        else:
+            self.send_response(404)
+            self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SheetsStub(ThreadingHTTPServer):
+    """Threaded HTTP server answering gviz queries and CSV exports from one frame.
+
+    ``requests`` holds ``(endpoint, query)`` tuples, where endpoint is
+    ``gviz`` or ``export``.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, sheet, host="localhost", port=0):
+        super().__init__((host, port), SheetsHandler)
+        self.sheet = sheet
+        self.typed, self.numeric = typed_view(sheet)
+        self.requests = []
+        self.requests_lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.port}"
+
+    def log(self, endpoint, query):
+        with self.requests_lock:
+            self.requests.append((endpoint, query))
+
+    def run_query(self, query):
+        match = QUERY_RE.match(query.strip())
+        if match is None:
+            raise ValueError(f"Invalid query: {query}")
+        select, where, limit = match.groups()
+        frame = self.typed
+        if where:
+            keep = pd.Series(False, index=frame.index)
+            for condition in re.split(r"\s+OR\s+", where, flags=re.IGNORECASE):
+                letter, _, literal = condition.partition("=")
+                col = frame.columns[column_index(letter)]
+                literal = literal.strip()
+                quoted = literal.startswith("'")
+                if quoted == self.numeric[col]:
+                    raise ValueError(f"Can't compare {col} with {literal}")
+                if quoted:
+                    keep |= frame[col] == literal.strip("'")
+                else:
+                    keep |= pd.to_numeric(frame[col], errors="coerce") == float(literal)
+            frame = frame[keep]
+        if select.strip() != "*":
+            frame = frame.iloc[:, [column_index(letter) for letter in select.split(",")]]
+        if limit:
+            frame = frame.head(int(limit))
+        return frame
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name="sheets-stub", daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Google Sheets stand-in for the contact sheet")
+    parser.add_argument("csv", help="CSV file served as every sheet")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    stub = SheetsStub(pd.read_csv(args.csv, dtype=str), args.host, args.port)
+    print(f"Sheets stub serving {args.csv} on {stub.base_url} (Ctrl+C to stop)")
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        counts = {}
+        for endpoint, _ in stub.requests:
+            counts[endpoint] = counts.get(endpoint, 0) + 1
+        print(f"Requests handled: {counts}")
+        stub.stop()
@@ -0,0 +1,290 @@
+"""Local stand-in for smtp.gmail.com, for exercising the send paths offline.
+
+Speaks enough SMTP for smtplib (EHLO, STARTTLS, AUTH PLAIN/LOGIN, MAIL, RCPT,
+DATA, RSET, NOOP, QUIT) and can inject per-message latency, random 4xx/5xx
+replies and dropped connections. Run it directly and point the app at it:
+
+    python smtp_sink.py --port 2525 --latency-ms 50 --fail-4xx 0.05
+    SMTP_HOST=localhost SMTP_PORT=2525 streamlit run app.py
+"""
+import argparse
+import base64
+import os
+import random
+import socket
+import socketserver
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+
+
+def make_self_signed_cert(directory):
+    certfile = os.path.join(directory, "sink-cert.pem")
+    keyfile = os.path.join(directory, "sink-key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=localhost", "-keyout", keyfile, "-out", certfile],
+        check=True, capture_output=True
+    )
+    return certfile, keyfile
+
+
+class SinkConfig:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, fail_4xx=0.0, fail_5xx=0.0, drop_rate=0.0,
+                 username=None, password=None, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.fail_4xx = fail_4xx
+        self.fail_5xx = fail_5xx
+        self.drop_rate = drop_rate
+        # Credentials to enforce; any login is accepted when left as None
+        self.username = username
+        self.password = password
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+
+    def roll(self):
+        # One draw per message decides its fate: drop, 4xx, 5xx or accept
+        with self.random_lock:
+            r = self.random.random()
+            delay = max(self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms), 0.0) / 1000
+        if r < self.drop_rate:
+            return "drop", delay
+        if r < self.drop_rate + self.fail_4xx:
+            return "4xx", delay
+        if r < self.drop_rate + self.fail_4xx + self.fail_5xx:
+            return "5xx", delay
+        return "ok", delay
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+        self.wfile.flush()
+
+    def readline(self):
+        line = self.rfile.readline(65537)
+        if not line:
+            raise ConnectionResetError("client closed connection")
+        return line.decode("utf-8", "replace").rstrip("\r\n")
+
+    def handle(self):
+        self.tls = False
+        self.authenticated = False
+        self.reset()
+        self.reply("220 localhost SMTP sink ready")
+        try:
+            while True:
+                line = self.readline()
+                verb, _, arg = line.partition(" ")
+                handler = getattr(self, "smtp_" + verb.upper(), None)
+                if handler is None:
+                    self.reply("502 5.5.2 Command not recognized")
+                elif handler(arg) == "close":
+                    return
+        except (ConnectionError, ssl.SSLError):
+            return
+
+    def finish(self):
+        super().finish()
+        # After STARTTLS this is the TLS socket, which socketserver doesn't know about
+        self.request.close()
+
+    def reset(self):
+        self.mail_from = None
+        self.rcpt_tos = []
+
+    def smtp_EHLO(self, arg):
+        features = ["250-localhost", "250-SIZE 35882577", "250-8BITMIME"]
+        if self.tls:
+            features.append("250-AUTH PLAIN LOGIN")
+        elif self.server.ssl_context is not None:
+            features.append("250-STARTTLS")
+        features.append("250 SMTPUTF8")
+        self.wfile.write("\r\n".join(features).encode() + b"\r\n")
+        self.wfile.flush()
+
+    def smtp_HELO(self, arg):
+        self.reply("250 localhost")
+
+    def smtp_STARTTLS(self, arg):
+        if self.tls or self.server.ssl_context is None:
+            self.reply("454 4.7.0 TLS not available")
+            return
+        self.reply("220 2.0.0 Ready to start TLS")
+        self.request = self.server.ssl_context.wrap_socket(self.request, server_side=True)
+        self.rfile = self.request.makefile("rb")
+        self.wfile = self.request.makefile("wb")
+        self.tls = True
+        self.reset()
+
+    def check_login(self, username, password):
+        config = self.server.config
+        ok = config.username is None or (username == config.username and password == config.password)
+        self.authenticated = ok
+        self.reply("235 2.7.0 Accepted" if ok else "535 5.7.8 Username and Password not accepted")
+
+    def smtp_AUTH(self, arg):
+        if not self.tls:
+            self.reply("530 5.7.0 Must issue a STARTTLS command first")
+            return
+        mechanism, _, initial = arg.partition(" ")
+        mechanism = mechanism.upper()
+        if mechanism == "PLAIN":
+            if not initial:
+                self.reply("334 ")
+                initial = self.readline()
+            _, username, password = base64.b64decode(initial).decode().split("\0")
+        elif mechanism == "LOGIN":
+            self.reply("334 " + base64.b64encode(b"Username:").decode())
+            username = base64.b64decode(self.readline()).decode()
+            self.reply("334 " + base64.b64encode(b"Password:").decode())
+            password = base64.b64decode(self.readline()).decode()
+        else:
+            self.reply("504 5.5.4 Unrecognized authentication type")
+            return
+        self.check_login(username, password)
+
+    def smtp_MAIL(self, arg):
+        if self.server.ssl_context is not None and not self.authenticated:
+            self.reply("530 5.7.0 Authentication Required")
+            return
+        self.mail_from = arg.partition(":")[2].strip()
+        self.reply("250 2.1.0 OK")
+
+    def smtp_RCPT(self, arg):
+        if self.mail_from is None:
+            self.reply("503 5.5.1 Need MAIL command")
+            return
+        self.rcpt_tos.append(arg.partition(":")[2].strip().strip("<>"))
+        self.reply("250 2.1.5 OK")
+
+    def smtp_DATA(self, arg):
+        if not self.rcpt_tos:
+            self.reply("503 5.5.1 Need RCPT command")
+            return
+        self.reply("354 Go ahead")
+        lines = []
+        while True:
+            line = self.readline()
+            if line == ".":
+                break
+            lines.append(line[1:] if line.startswith("..") else line)
+        outcome, delay = self.server.config.roll()
+        time.sleep(delay)
+        if outcome == "drop":
+            self.server.record("dropped", self.mail_from, self.rcpt_tos, lines)
+            self.request.shutdown(socket.SHUT_RDWR)
+            return "close"
+        if outcome == "4xx":
+            self.server.record("4xx", self.mail_from, self.rcpt_tos, lines)
+            self.reply("451 4.3.0 Temporary failure, try again later")
+        elif outcome == "5xx":
+            self.server.record("5xx", self.mail_from, self.rcpt_tos, lines)
+            self.reply("554 5.6.0 Message rejected")
+        else:
+            self.server.record("accepted", self.mail_from, self.rcpt_tos, lines)
+            self.reply("250 2.0.0 OK queued")
+        self.reset()
+
+    def smtp_RSET(self, arg):
+        self.reset()
+        self.reply("250 2.0.0 OK")
+
+    def smtp_NOOP(self, arg):
+        self.reply("250 2.0.0 OK")
+
+    def smtp_QUIT(self, arg):
+        self.reply("221 2.0.0 Bye")
+        return "close"
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Threaded SMTP server that records every message it is handed.
+
+    ``messages`` holds ``(outcome, mail_from, rcpt_tos, lines)`` tuples, where
+    outcome is ``accepted``, ``4xx``, ``5xx`` or ``dropped``.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="localhost", port=0, config=None, certfile=None, keyfile=None, tls=True):
+        super().__init__((host, port), SMTPHandler)
+        self.config = config or SinkConfig()
+        self.messages = []
+        self.messages_lock = threading.Lock()
+        self.ssl_context = None
+        self._tempdir = None
+        if tls:
+            if certfile is None:
+                self._tempdir = tempfile.TemporaryDirectory()
+                certfile, keyfile = make_self_signed_cert(self._tempdir.name)
+            self.ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            self.ssl_context.load_cert_chain(certfile, keyfile)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def record(self, outcome, mail_from, rcpt_tos, lines):
+        with self.messages_lock:
+            self.messages.append((outcome, mail_from, list(rcpt_tos), lines))
+
+    def received(self, outcome="accepted"):
+        with self.messages_lock:
+            return [m for m in self.messages if m[0] == outcome]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name="smtp-sink", daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._tempdir is not None:
+            self._tempdir.cleanup()
+
+
+def add_fault_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay before answering each message")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="random +/- spread on the latency")
+    parser.add_argument("--fail-4xx", type=float, default=0.0, help="share of messages answered 451")
+    parser.add_argument("--fail-5xx", type=float, default=0.0, help="share of messages answered 554")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="share of messages that drop the connection")
+    parser.add_argument("--username", help="only accept this login (default: accept any)")
+    parser.add_argument("--password", help="password for --username")
+    parser.add_argument("--seed", type=int, help="seed for the fault dice, for repeatable runs")
+
+
+def config_from_args(args):
+    return SinkConfig(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, fail_4xx=args.fail_4xx,
+        fail_5xx=args.fail_5xx, drop_rate=args.drop_rate, username=args.username,
+        password=args.password, seed=args.seed
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local SMTP sink with fault injection")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--certfile", help="TLS certificate (a self-signed one is generated if omitted)")
+    parser.add_argument("--keyfile", help="TLS private key")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+    sink = SMTPSink(args.host, args.port, config_from_args(args), args.certfile, args.keyfile)
+    print(f"SMTP sink listening on {args.host}:{sink.port} (Ctrl+C to stop)")
+    try:
+        sink.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        counts = {}
+        for outcome, *_ in sink.messages:
+            counts[outcome] = counts.get(outcome, 0) + 1
+        print(f"Messages handled: {counts}")
+        sink.stop()
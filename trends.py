@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+# Rolling average window and how many quiet weeks in a row count as a drop-off
+ROLLING_WEEKS = 4
+DROPOFF_WEEKS = 2
+
+
+def build_week_matrix(snapshots, column):
+    """Align dated exports into a student x week matrix of ``column``.
+
+    ``snapshots`` is a list of ``(date, DataFrame)`` pairs. Students missing
+    from a snapshot get NaN for that week.
+    """
+    frames = []
+    for date, df in snapshots:
+        frame = df[["Login ID", column]].copy()
+        frame["Login ID"] = frame["Login ID"].astype(str)
+        frame["Week"] = date
+        frames.append(frame)
+    stacked = pd.concat(frames, ignore_index=True)
+    matrix = stacked.pivot_table(index="Login ID", columns="Week", values=column, aggfunc="last")
+    return matrix.sort_index(axis=1)
+
+
+def weekly_deltas(matrix):
+    values = matrix.to_numpy(dtype=float)
+    # Carry each student's last total across weeks they were missing from, so the
+    # work done meanwhile lands on the next week they appear (NaN before the first)
+    filled = matrix.ffill(axis=1).to_numpy(dtype=float)
+    deltas = np.diff(filled, axis=1)
+    # The exports are running totals; a drop means the count was reset, so the
+    # new total is what was done since then
+    deltas = np.where(deltas < 0, values[:, 1:], deltas)
+    # Weeks the student wasn't in the export stay missing rather than zero
+    deltas[np.isnan(values[:, 1:])] = np.nan
+    return pd.DataFrame(deltas, index=matrix.index, columns=matrix.columns[1:])
+
+
+def rolling_average(deltas, window=ROLLING_WEEKS):
+    values = np.nan_to_num(deltas, nan=0.0)
+    present = (~np.isnan(deltas)).astype(float)
+    # Windowed sums from a padded cumulative sum, one pass for every student
+    pad = np.zeros((values.shape[0], 1))
+    sums = np.cumsum(np.hstack([pad, values]), axis=1)
+    counts = np.cumsum(np.hstack([pad, present]), axis=1)
+    starts = np.maximum(np.arange(1, values.shape[1] + 1) - window, 0)
+    window_sums = sums[:, 1:] - sums[:, starts]
+    window_counts = counts[:, 1:] - counts[:, starts]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(window_counts > 0, window_sums / window_counts, np.nan)
+
+
+def active_streaks(active):
+    # Current streak: run of active weeks ending at the latest snapshot
+    current = np.cumprod(active[:, ::-1], axis=1).sum(axis=1)
+    # Longest streak: running count that resets at every inactive week
+    counts = np.cumsum(active, axis=1)
+    resets = np.maximum.accumulate(np.where(active, 0, counts), axis=1)
+    longest = (counts - resets).max(axis=1, initial=0)
+    return current, longest
+
+
+def latest_week(matrix):
+    return matrix[:, -1] if matrix.shape[1] else np.full(len(matrix), np.nan)
+
+
+def compute_trend_metrics(snapshots, window=ROLLING_WEEKS, dropoff_weeks=DROPOFF_WEEKS):
+    """Per-student trend metrics across every snapshot.
+
+    Returns ``(metrics, ws_deltas)`` where ``metrics`` has one row per Login ID
+    and ``ws_deltas`` is the student x week matrix of worksheets per week.
+    """
+    snapshots = sorted(snapshots, key=lambda snap: snap[0])
+    ws_deltas = weekly_deltas(build_week_matrix(snapshots, "# of WS"))
+    day_deltas = weekly_deltas(build_week_matrix(snapshots, "# of Study Days"))
+
+    ws = ws_deltas.to_numpy()
+    days = day_deltas.reindex(index=ws_deltas.index).to_numpy()
+    active = np.nan_to_num(ws, nan=0.0) > 0
+    current, longest = active_streaks(active)
+    ws_rolling = rolling_average(ws, window)
+    days_rolling = rolling_average(days, window)
+    # Dropped off: active at some point, but quiet for the last few weeks
+    recent = active[:, -dropoff_weeks:].any(axis=1) if ws.shape[1] else np.zeros(len(ws), dtype=bool)
+    dropped = active.any(axis=1) & ~recent
+
+    metrics = pd.DataFrame({
+        "Login ID": ws_deltas.index,
+        "Weeks Tracked": (~np.isnan(ws)).sum(axis=1),
+        "Weeks Active": active.sum(axis=1),
+        f"Avg Worksheets ({window} wk)": np.round(latest_week(ws_rolling), 1),
+        f"Avg Study Days ({window} wk)": np.round(latest_week(days_rolling), 1),
+        "Active Streak": current,
+        "Longest Streak": longest,
+        "Dropped Off": dropped,
+    })
+    return metrics, ws_deltas